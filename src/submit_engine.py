@@ -4,15 +4,179 @@ WRF Model Submission Engine for HPC using Slurm
 """
 
 import argparse
+import atexit
+import functools
 import json
 import os
+import shutil
 import sys
 import subprocess
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-import f90nml
+from typing import List, Dict, Any, Optional, Union
 import math
+import re
+import secrets
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Matches the `&time_control` header of a namelist group; the end of the group
+# is located by find_group_end
+TIME_CONTROL_RE = re.compile(r'^[ \t]*&time_control\b', re.M | re.I)
+
+# Keys rewritten in time_control for each run. Each pattern captures the
+# `key = ` prefix and the first (domain 1) value so it can be replaced in place.
+TIME_KEYS = [
+    f"{prefix}_{unit}"
+    for prefix in ("start", "end")
+    for unit in ("year", "month", "day", "hour", "minute", "second")
+]
+TIME_KEY_RES = {
+    key: re.compile(rf'^([ \t]*{key}[ \t]*=[ \t]*)([^,\s/]+)', re.M | re.I)
+    for key in TIME_KEYS + ["restart"]
+}
+
+# Expected output files per run are `<kind>_<domain>_<end time>`.
+# Typically WRF outputs one file per domain; adjust as needed.
+DEFAULT_DOMAINS = ["d01"]
+DEFAULT_FILE_KINDS = ["wrfout", "wrfrst"]
+
+# Time format of WRF output filenames
+WRF_TIME_FORMAT = "%Y-%m-%d_%H:%M:%S"
+
+# Reference point for integer time arithmetic
+EPOCH = datetime(1970, 1, 1)
+
+# Seconds between squeue checks while the daemon waits for a finished job to
+# leave the queue
+DAEMON_JOB_EXIT_INTERVAL = 5.0
+
+# Threads used when checking many work directories at once
+CHECK_PROGRESS_MAX_WORKERS = 32
+
+# Seconds a squeue result is reused before querying Slurm again
+SQUEUE_CACHE_TTL = 2.0
+
+
+def find_group_end(text: str, pos: int) -> Optional[int]:
+    """
+    Find the `/` terminating a namelist group
+    
+    Scans from `pos` (just past the group header) and skips quoted strings and
+    `!` comments, so the terminator may sit on its own line, at the end of a
+    line or on the header line itself.
+    
+    Returns:
+        Index of the terminating `/`, or None if another group starts (or the
+        text ends) before one is found
+    """
+    quote = None
+    i = pos
+    while i < len(text):
+        c = text[i]
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c == '!':
+            newline = text.find('\n', i)
+            if newline < 0:
+                return None
+            i = newline
+        elif c == '/':
+            return i
+        elif c in '&$':
+            return None
+        i += 1
+    
+    return None
+
+
+def format_wrf_time(t: datetime) -> str:
+    """
+    Format a time as used in WRF output filenames (YYYY-MM-DD_HH:MM:SS)
+    
+    Formatted by hand rather than with strftime, which is slower and does
+    not zero-pad years before 1000 on every platform.
+    """
+    return (f"{t.year:04d}-{t.month:02d}-{t.day:02d}_"
+            f"{t.hour:02d}:{t.minute:02d}:{t.second:02d}")
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_executable(name: str) -> str:
+    """Resolve a command name to its absolute path, or return it unchanged if not found"""
+    return shutil.which(name) or name
+
+
+def run_command(args: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """
+    Run a command via subprocess.run, allowing CPython's posix_spawn fast path
+    
+    posix_spawn is only used for an absolute executable path with
+    close_fds=False and no cwd; otherwise CPython still avoids a full fork by
+    using vfork as long as no preexec_fn is given. Leaving close_fds off is
+    safe because Python creates file descriptors non-inheritable.
+    """
+    return subprocess.run(
+        [resolve_executable(args[0])] + list(args[1:]),
+        close_fds=False,
+        **kwargs
+    )
+
+
+def read_json(path: Path) -> Any:
+    """Read a JSON file, using orjson when available"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_json(path: Path, data: Any) -> None:
+    """
+    Atomically write a JSON file indented by two spaces
+    
+    The data is written and fsynced to a uniquely named temporary file next
+    to `path`, which then replaces `path`, so readers never see a truncated
+    file and concurrent writers do not share a temporary file. Uses orjson
+    when available.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{secrets.token_hex(4)}.tmp")
+    
+    # Created with mode 0666 so the kernel applies the umask, as a plain
+    # open() would
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        f = open(fd, 'wb' if orjson is not None else 'w')
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp_path)
+        raise
+    
+    try:
+        with f:
+            if orjson is not None:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            else:
+                json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
 
 
 class SubmitEngine:
@@ -28,16 +192,68 @@ class SubmitEngine:
         self.work_dir = Path(work_dir).resolve()
         self.meta_file = self.work_dir / ".meta"
         self.lock_file = self.work_dir / ".lock"
+        self.progress_file = self.work_dir / ".progress"
         self.record_file = self.work_dir / "submit_record.txt"
         self.namelist_original = self.work_dir / "namelist.input.original"
         self.namelist_input = self.work_dir / "namelist.input"
         
+        # Parsed file caches, keyed on (mtime_ns, size) of the source file
+        self._nml_cache = None
+        self._meta_cache = None
+        self._timing_cache = None
+        
+        # Record file handle, opened on first append
+        self._record_fh = None
+        self._record_atexit = False
+        
+        # squeue results: job_id -> (monotonic timestamp, running)
+        self._squeue_cache = {}
+        
+    def split_namelist(self) -> Optional[tuple]:
+        """
+        Split the original namelist text around the time_control group
+        
+        Returns:
+            tuple: (head, time_control_block, tail) as text, or None if the
+            group cannot be located
+        """
+        text = self.namelist_original.read_text()
+        match = TIME_CONTROL_RE.search(text)
+        if match is None:
+            return None
+        
+        end = find_group_end(text, match.end())
+        if end is None:
+            return None
+        
+        return text[:match.start()], text[match.start():end + 1], text[end + 1:]
+    
     def parse_namelist(self) -> Dict[str, Any]:
-        """Parse the original namelist file"""
+        """
+        Parse the time_control group of the original namelist file
+        
+        Only the `&time_control` block is handed to f90nml; the rest of the
+        namelist is never tokenized. Falls back to a full parse if the block
+        cannot be located. The result is cached until the file changes.
+        """
         if not self.namelist_original.exists():
             raise FileNotFoundError(f"Namelist file not found: {self.namelist_original}")
         
-        nml = f90nml.read(self.namelist_original)
+        st = self.namelist_original.stat()
+        key = (st.st_mtime_ns, st.st_size)
+        if self._nml_cache is not None and self._nml_cache[0] == key:
+            return self._nml_cache[1]
+        
+        # Imported here so commands that never read the namelist skip its cost
+        import f90nml
+        
+        parts = self.split_namelist()
+        if parts is not None:
+            nml = f90nml.Parser().reads(parts[1])
+        else:
+            nml = f90nml.read(self.namelist_original)
+        
+        self._nml_cache = (key, nml)
         return nml
     
     def calculate_total_runs(self, nml: Dict[str, Any]) -> tuple:
@@ -85,42 +301,54 @@ class SubmitEngine:
         
         return num_runs, start_time, end_time, run_length
     
-    def generate_expected_files(self, num_runs: int, start_time: datetime, 
-                               run_length: timedelta) -> List[List[str]]:
+    def run_timing(self, meta: Dict[str, Any]) -> tuple:
         """
-        Generate list of expected output files for each run
+        Get the simulation start and run length as integer seconds
+        
+        Cached per meta (keyed on its created_at) so repeated probes do not
+        re-parse the ISO start time.
         
-        Args:
-            num_runs: Total number of runs
-            start_time: Simulation start time
-            run_length: Length of each run
-            
         Returns:
-            List of lists, where each inner list contains expected files for that run
+            tuple: (start seconds since EPOCH, run length in seconds)
         """
-        expected_files = []
+        key = meta['created_at']
+        if self._timing_cache is None or self._timing_cache[0] != key:
+            start_time = datetime.fromisoformat(meta['start_time'])
+            start_seconds = (start_time - EPOCH) // timedelta(seconds=1)
+            step = int(meta['run_length_seconds'])
+            self._timing_cache = (key, (start_seconds, step))
         
-        for run_idx in range(num_runs):
-            run_end_time = start_time + run_length * (run_idx + 1)
-            
-            # Generate expected WRF output filenames
-            # Format: wrfout_d01_YYYY-MM-DD_HH:MM:SS
-            files_for_run = []
-            
-            # Typically WRF outputs one file per domain
-            # Adjust domain count as needed (here assuming domain 01)
-            domain_str = "d01"
-            time_str = run_end_time.strftime("%Y-%m-%d_%H:%M:%S")
-            output_file = f"wrfout_{domain_str}_{time_str}"
-            files_for_run.append(output_file)
-            
-            # Can add additional expected files like restart files
-            restart_file = f"wrfrst_{domain_str}_{time_str}"
-            files_for_run.append(restart_file)
+        return self._timing_cache[1]
+    
+    def run_boundary(self, meta: Dict[str, Any], run_idx: int) -> datetime:
+        """
+        Get the start time of a run, which is also the end time of the previous one
+        
+        Args:
+            meta: Metadata describing the simulation
+            run_idx: Run index (0-based)
+        """
+        start_seconds, step = self.run_timing(meta)
+        return EPOCH + timedelta(seconds=start_seconds + step * run_idx)
+    
+    def expected_files_for_run(self, meta: Dict[str, Any], run_idx: int) -> List[str]:
+        """
+        Generate the list of expected output files for a single run
+        
+        Args:
+            meta: Metadata describing the simulation
+            run_idx: Run index (0-based)
             
-            expected_files.append(files_for_run)
+        Returns:
+            List of files that should exist once the run is completed
+        """
+        time_str = format_wrf_time(self.run_boundary(meta, run_idx + 1))
         
-        return expected_files
+        return [
+            f"{kind}_{domain}_{time_str}"
+            for domain in meta.get('domains', DEFAULT_DOMAINS)
+            for kind in meta.get('file_kinds', DEFAULT_FILE_KINDS)
+        ]
     
     def generate_meta(self, force: bool = False) -> None:
         """
@@ -143,71 +371,274 @@ class SubmitEngine:
         # Calculate runs
         num_runs, start_time, end_time, run_length = self.calculate_total_runs(nml)
         
-        # Generate expected files
-        expected_files = self.generate_expected_files(num_runs, start_time, run_length)
-        
         # Create metadata
         meta = {
             "num_runs": num_runs,
             "start_time": start_time.isoformat(),
             "end_time": end_time.isoformat(),
             "run_length_seconds": run_length.total_seconds(),
-            "expected_files": expected_files,
+            "domains": DEFAULT_DOMAINS,
+            "file_kinds": DEFAULT_FILE_KINDS,
             "created_at": datetime.now().isoformat()
         }
         
         # Write metadata
-        with open(self.meta_file, 'w') as f:
-            json.dump(meta, f, indent=2)
+        write_json(self.meta_file, meta)
         
         print(f"Meta file generated: {self.meta_file}")
         print(f"Total runs planned: {num_runs}")
         print(f"Simulation period: {start_time} to {end_time}")
     
     def load_meta(self) -> Dict[str, Any]:
-        """Load metadata from file"""
+        """Load metadata from file (cached until the file changes)"""
         if not self.meta_file.exists():
             raise FileNotFoundError(f"Meta file not found: {self.meta_file}. Run with --gen-meta first.")
         
-        with open(self.meta_file, 'r') as f:
-            return json.load(f)
+        st = self.meta_file.stat()
+        key = (st.st_mtime_ns, st.st_size)
+        if self._meta_cache is not None and self._meta_cache[0] == key:
+            return self._meta_cache[1]
+        
+        meta = read_json(self.meta_file)
+        
+        self._meta_cache = (key, meta)
+        return meta
+    
+    def list_dir(self, directory: Path) -> set:
+        """
+        List entry names of a directory in a single scan
+        
+        Args:
+            directory: Directory to list
+            
+        Returns:
+            Set of entry names, empty if the directory does not exist
+        """
+        try:
+            with os.scandir(directory) as it:
+                return {entry.name for entry in it}
+        except FileNotFoundError:
+            return set()
+    
+    def list_cached(self, listings: Dict[str, set], parent: str) -> set:
+        """
+        List a directory relative to the work directory, memoized in `listings`
+        
+        Args:
+            listings: Cache of directory listings, keyed on relative path
+            parent: Directory relative to the work directory ('' for itself)
+        """
+        if parent not in listings:
+            listings[parent] = self.list_dir(self.work_dir / parent)
+        return listings[parent]
+    
+    def progress_hint(self, meta: Dict[str, Any], names: set) -> Optional[int]:
+        """
+        Estimate the number of completed runs from the newest output file
+        
+        WRF output names sort lexically by time, so the newest file of the
+        first kind and domain (e.g. wrfout_d01_*) gives the furthest point the
+        simulation has reached. The caller must still verify the files at the
+        returned run boundary.
+        
+        Args:
+            meta: Metadata describing the simulation
+            names: Entry names of the work directory
+            
+        Returns:
+            Estimated number of completed runs, or None if no usable file
+        """
+        domain = meta.get('domains', DEFAULT_DOMAINS)[0]
+        kind = meta.get('file_kinds', DEFAULT_FILE_KINDS)[0]
+        prefix = f"{kind}_{domain}_"
+        
+        latest = max((n for n in names if n.startswith(prefix)), default=None)
+        if latest is None:
+            return None
+        
+        try:
+            latest_time = datetime.strptime(latest[len(prefix):], WRF_TIME_FORMAT)
+        except ValueError:
+            return None
+        
+        start_seconds, step = self.run_timing(meta)
+        elapsed = (latest_time - EPOCH) // timedelta(seconds=1) - start_seconds
+        if elapsed < step:
+            return None
+        
+        return min(elapsed // step, meta['num_runs'])
+    
+    def load_progress(self, meta: Dict[str, Any]) -> int:
+        """
+        Load the last verified run index from the progress file
+        
+        Args:
+            meta: Current metadata; the pointer is ignored if it was recorded
+                against a different meta file
+            
+        Returns:
+            Number of runs previously verified as complete, 0 if unknown
+        """
+        if not self.progress_file.exists():
+            return 0
+        
+        try:
+            progress = read_json(self.progress_file)
+        except (OSError, ValueError):
+            return 0
+        
+        if progress.get('meta_created_at') != meta['created_at']:
+            return 0
+        
+        return progress.get('last_verified', 0)
+    
+    def save_progress(self, meta: Dict[str, Any], run_idx: int) -> None:
+        """
+        Persist the last verified run index to the progress file
+        
+        Args:
+            meta: Current metadata
+            run_idx: Number of runs verified as complete
+        """
+        progress = {
+            "last_verified": run_idx,
+            "meta_created_at": meta['created_at']
+        }
+        
+        write_json(self.progress_file, progress)
     
     def check_progress(self) -> int:
         """
         Check current progress by verifying expected files
         
+        The search resumes from the last verified run stored in the progress
+        file, so steady-state checks only look at newly completed runs. Runs
+        are assumed to complete in order, which lets the remaining runs be
+        binary searched in O(log N) probes.
+        
         Returns:
             Current run index (0-based). If all files for run N exist, returns N+1
         """
         meta = self.load_meta()
-        expected_files = meta['expected_files']
+        num_runs = meta['num_runs']
+        
+        # List each directory once instead of stat-ing every expected file
+        listings = {}
+        
+        def exists(f: str) -> bool:
+            parent, name = os.path.split(f)
+            return name in self.list_cached(listings, parent)
+        
+        def run_complete(run_idx: int) -> bool:
+            return all(exists(f) for f in self.expected_files_for_run(meta, run_idx))
         
-        for run_idx, files in enumerate(expected_files):
-            # Check if all files exist for this run
-            all_exist = all((self.work_dir / f).exists() for f in files)
-            if not all_exist:
-                return run_idx
+        last_verified = self.load_progress(meta)
+        start_idx = min(last_verified, num_runs)
         
-        # All runs completed
-        return len(expected_files)
+        # Rescan from the beginning if the last verified run has since
+        # lost its files
+        if start_idx > 0 and not run_complete(start_idx - 1):
+            start_idx = 0
+        
+        # Jump ahead to the run implied by the newest output file, provided
+        # the files at that run boundary are all present
+        hint = self.progress_hint(meta, self.list_cached(listings, ''))
+        if hint is not None and hint > start_idx and run_complete(hint - 1):
+            start_idx = hint
+        
+        # Runs complete in order, so binary search for the first incomplete one
+        lo, hi = start_idx, num_runs
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if run_complete(mid):
+                lo = mid + 1
+            else:
+                hi = mid
+        run_idx = lo
+        
+        # The pointer is only a cache; a read-only work directory (e.g. a
+        # shared project space) must not break status checks
+        if run_idx != last_verified:
+            try:
+                self.save_progress(meta, run_idx)
+            except OSError:
+                pass
+        
+        return run_idx
+    
+    @classmethod
+    def check_progress_many(cls, work_dirs: List[str]) -> List[Union[int, Exception]]:
+        """
+        Check progress of several work directories concurrently
+        
+        Each check is dominated by filesystem metadata latency, so running
+        them in threads overlaps the round trips on networked filesystems.
+        A failing directory (e.g. missing .meta or unreadable) does not affect
+        the others: its slot holds the exception instead of a run index.
+        
+        Args:
+            work_dirs: Working directories, each with its own .meta
+            
+        Returns:
+            Current run index of each work directory, or the exception raised
+            while checking it, in the same order
+        """
+        if not work_dirs:
+            return []
+        
+        def check(work_dir: str) -> Union[int, Exception]:
+            try:
+                return cls(work_dir=work_dir).check_progress()
+            except Exception as e:
+                return e
+        
+        # Imported here so CLI invocations do not pay for concurrent.futures
+        from concurrent.futures import ThreadPoolExecutor
+        
+        max_workers = min(CHECK_PROGRESS_MAX_WORKERS, len(work_dirs))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(check, work_dirs))
     
-    def create_lock(self, job_id: str, run_idx: int) -> None:
+    def create_lock(self, job_id: str, run_idx: int, attempt: int = 1,
+                    meta_created_at: Optional[str] = None) -> None:
         """
         Create lock file with job information
         
         Args:
             job_id: Slurm job ID
             run_idx: Current run index
+            attempt: How many times this run has been submitted, including this job
+            meta_created_at: created_at of the meta the job was submitted under
         """
         lock_data = {
             "job_id": job_id,
             "run_idx": run_idx,
+            "attempt": attempt,
+            "meta_created_at": meta_created_at,
             "timestamp": datetime.now().isoformat(),
             "pid": os.getpid()
         }
         
-        with open(self.lock_file, 'w') as f:
-            json.dump(lock_data, f, indent=2)
+        write_json(self.lock_file, lock_data)
+    
+    def lock_attempts(self, lock: Optional[Dict[str, Any]], meta: Dict[str, Any],
+                      run_idx: int) -> int:
+        """
+        Number of times a run has been submitted according to a lock
+        
+        Only a lock for the same run under the current meta counts, so locks
+        left over from an earlier simulation (e.g. after --reset) are ignored.
+        
+        Args:
+            lock: Lock data, or None
+            meta: Current metadata
+            run_idx: Run index (0-based)
+        """
+        if (lock is None or lock['run_idx'] != run_idx
+                or lock.get('meta_created_at') != meta['created_at']):
+            return 0
+        
+        return lock.get('attempt', 1)
     
     def remove_lock(self, force: bool = False) -> None:
         """
@@ -234,29 +665,60 @@ class SubmitEngine:
         if not self.lock_file.exists():
             return None
         
-        with open(self.lock_file, 'r') as f:
-            return json.load(f)
+        return read_json(self.lock_file)
     
-    def is_job_running(self, job_id: str) -> bool:
+    def query_jobs(self, job_ids: List[str]) -> Dict[str, bool]:
         """
-        Check if a Slurm job is still running
+        Check whether several Slurm jobs are running with a single squeue call
+        
+        Results are stored in the squeue cache.
         
         Args:
-            job_id: Slurm job ID
+            job_ids: Slurm job IDs
             
         Returns:
-            True if job is running or pending, False otherwise
+            Mapping of job ID to True if the job is running or pending
         """
+        if not job_ids:
+            return {}
+        
         try:
-            result = subprocess.run(
-                ['squeue', '-j', job_id, '-h'],
+            result = run_command(
+                ['squeue', '-j', ','.join(job_ids), '-h', '-o', '%i'],
                 capture_output=True,
                 text=True,
                 timeout=10
             )
-            return len(result.stdout.strip()) > 0
+            # Array jobs are reported as <job_id>_<task_id>
+            listed = {line.strip().split('_')[0] for line in result.stdout.splitlines()}
         except (subprocess.SubprocessError, FileNotFoundError):
-            return False
+            listed = set()
+        
+        now = time.monotonic()
+        running = {job_id: job_id in listed for job_id in job_ids}
+        for job_id, is_running in running.items():
+            self._squeue_cache[job_id] = (now, is_running)
+        
+        return running
+    
+    def is_job_running(self, job_id: str) -> bool:
+        """
+        Check if a Slurm job is still running
+        
+        Answers from the squeue cache if it was queried within the last
+        SQUEUE_CACHE_TTL seconds.
+        
+        Args:
+            job_id: Slurm job ID
+            
+        Returns:
+            True if job is running or pending, False otherwise
+        """
+        cached = self._squeue_cache.get(job_id)
+        if cached is not None and time.monotonic() - cached[0] < SQUEUE_CACHE_TTL:
+            return cached[1]
+        
+        return self.query_jobs([job_id])[job_id]
     
     def check_status(self) -> None:
         """Check and display current status"""
@@ -314,7 +776,8 @@ class SubmitEngine:
             return
         
         try:
-            subprocess.run(['scancel', job_id], check=True)
+            run_command(['scancel', job_id], check=True)
+            self._squeue_cache.pop(job_id, None)
             print(f"Job {job_id} cancelled.")
             self.remove_lock(force=True)
         except subprocess.CalledProcessError as e:
@@ -334,16 +797,50 @@ class SubmitEngine:
             self.meta_file.unlink()
             print(f"Meta file removed: {self.meta_file}")
         
+        # Remove progress pointer
+        if self.progress_file.exists():
+            self.progress_file.unlink()
+        
         print("Reset complete.")
     
     def clear_record(self) -> None:
         """Remove submission record file"""
+        self.close_record()
+        
         if self.record_file.exists():
             self.record_file.unlink()
             print(f"Record file removed: {self.record_file}")
         else:
             print("No record file found.")
     
+    def substitute_time_control(self, values: Dict[str, str]) -> Optional[str]:
+        """
+        Rewrite values inside the time_control group of the original namelist
+        
+        Only the first (domain 1) value of each key is replaced; everything
+        else in the file is kept byte-for-byte.
+        
+        Args:
+            values: Mapping of time_control key to its new literal value
+            
+        Returns:
+            The updated namelist text, or None if the group or any key cannot
+            be located
+        """
+        parts = self.split_namelist()
+        if parts is None:
+            return None
+        
+        head, block, tail = parts
+        for key, value in values.items():
+            block, count = TIME_KEY_RES[key].subn(
+                lambda m: m.group(1) + value, block, count=1
+            )
+            if count == 0:
+                return None
+        
+        return head + block + tail
+    
     def update_namelist(self, run_idx: int) -> None:
         """
         Update namelist.input for the current run
@@ -352,39 +849,54 @@ class SubmitEngine:
             run_idx: Current run index (0-based)
         """
         meta = self.load_meta()
-        nml = self.parse_namelist()
         
         # Calculate start and end times for this run
-        base_start = datetime.fromisoformat(meta['start_time'])
-        run_length = timedelta(seconds=meta['run_length_seconds'])
+        run_start = self.run_boundary(meta, run_idx)
+        run_end = self.run_boundary(meta, run_idx + 1)
         
-        run_start = base_start + run_length * run_idx
-        run_end = run_start + run_length
+        # Restart for runs after the first
+        restart = run_idx > 0
         
-        # Update time_control section
-        time_control = nml['time_control']
+        values = {}
+        for prefix, t in (("start", run_start), ("end", run_end)):
+            values[f"{prefix}_year"] = f"{t.year:04d}"
+            values[f"{prefix}_month"] = f"{t.month:02d}"
+            values[f"{prefix}_day"] = f"{t.day:02d}"
+            values[f"{prefix}_hour"] = f"{t.hour:02d}"
+            values[f"{prefix}_minute"] = f"{t.minute:02d}"
+            values[f"{prefix}_second"] = f"{t.second:02d}"
+        values["restart"] = ".true." if restart else ".false."
+        
+        text = self.substitute_time_control(values)
+        if text is not None:
+            with open(self.namelist_input, 'w') as f:
+                f.write(text)
+        else:
+            # The group or one of its keys could not be located textually,
+            # fall back to a full f90nml round-trip
+            import f90nml
+            
+            nml = f90nml.read(self.namelist_original)
+            time_control = nml['time_control']
+            
+            def set_first(key: str, value: int) -> None:
+                # Keys may be per-domain lists, scalars, or missing
+                current = time_control.get(key)
+                if isinstance(current, list) and current:
+                    current[0] = value
+                else:
+                    time_control[key] = value
+            
+            for prefix, t in (("start", run_start), ("end", run_end)):
+                set_first(f"{prefix}_year", t.year)
+                set_first(f"{prefix}_month", t.month)
+                set_first(f"{prefix}_day", t.day)
+                set_first(f"{prefix}_hour", t.hour)
+                set_first(f"{prefix}_minute", t.minute)
+                set_first(f"{prefix}_second", t.second)
+            time_control['restart'] = restart
+            nml.write(self.namelist_input, force=True)
         
-        # Update start time
-        time_control['start_year'][0] = run_start.year
-        time_control['start_month'][0] = run_start.month
-        time_control['start_day'][0] = run_start.day
-        time_control['start_hour'][0] = run_start.hour
-        time_control['start_minute'][0] = run_start.minute
-        time_control['start_second'][0] = run_start.second
-        
-        # Update end time
-        time_control['end_year'][0] = run_end.year
-        time_control['end_month'][0] = run_end.month
-        time_control['end_day'][0] = run_end.day
-        time_control['end_hour'][0] = run_end.hour
-        time_control['end_minute'][0] = run_end.minute
-        time_control['end_second'][0] = run_end.second
-        
-        # Set restart flag (restart for runs after the first)
-        time_control['restart'] = run_idx > 0
-        
-        # Write updated namelist
-        nml.write(self.namelist_input, force=True)
         print(f"Updated namelist for run {run_idx + 1}: {run_start} to {run_end}")
     
     def append_record(self, job_id: str, run_idx: int) -> None:
@@ -398,8 +910,31 @@ class SubmitEngine:
         timestamp = datetime.now().isoformat()
         record_line = f"{timestamp} | Run {run_idx + 1} | Job ID: {job_id}\n"
         
-        with open(self.record_file, 'a') as f:
-            f.write(record_line)
+        # Reopen if the file was removed or replaced since it was opened,
+        # e.g. by --clear-record from another process
+        if self._record_fh is not None:
+            try:
+                open_ino = os.fstat(self._record_fh.fileno()).st_ino
+                stale = open_ino != self.record_file.stat().st_ino
+            except FileNotFoundError:
+                stale = True
+            if stale:
+                self.close_record()
+        
+        if self._record_fh is None:
+            # Line buffered, so each record reaches the file as one write
+            self._record_fh = open(self.record_file, 'a', buffering=1)
+            if not self._record_atexit:
+                atexit.register(self.close_record)
+                self._record_atexit = True
+        
+        self._record_fh.write(record_line)
+    
+    def close_record(self) -> None:
+        """Close the record file handle if it is open"""
+        if self._record_fh is not None:
+            self._record_fh.close()
+            self._record_fh = None
     
     def submit(self, sbatch_script: str = "submit.sh") -> None:
         """
@@ -409,6 +944,7 @@ class SubmitEngine:
             sbatch_script: Path to the sbatch submission script
         """
         # Check for lock
+        stale_lock = None
         if self.lock_file.exists():
             lock = self.load_lock()
             if self.is_job_running(lock['job_id']):
@@ -416,6 +952,7 @@ class SubmitEngine:
                 return
             else:
                 print("Lock file exists but job is not running. Removing lock.")
+                stale_lock = lock
                 self.remove_lock(force=True)
         
         # Check meta
@@ -444,7 +981,7 @@ class SubmitEngine:
             return
         
         try:
-            result = subprocess.run(
+            result = run_command(
                 ['sbatch', str(sbatch_path)],
                 capture_output=True,
                 text=True,
@@ -458,8 +995,9 @@ class SubmitEngine:
             
             print(f"Job submitted: {job_id}")
             
-            # Create lock
-            self.create_lock(job_id, current_run)
+            # Create lock, counting resubmissions of a run that did not complete
+            attempt = self.lock_attempts(stale_lock, meta, current_run) + 1
+            self.create_lock(job_id, current_run, attempt, meta['created_at'])
             
             # Append to record
             self.append_record(job_id, current_run)
@@ -467,6 +1005,117 @@ class SubmitEngine:
         except subprocess.CalledProcessError as e:
             print(f"Failed to submit job: {e}")
             print(f"Error output: {e.stderr}")
+    
+    def wait_for_run(self, meta: Dict[str, Any], run_idx: int, inotify: Any,
+                     timeout: float) -> None:
+        """
+        Wait until the expected files of a run have appeared, or until timeout
+        
+        Args:
+            meta: Metadata describing the simulation
+            run_idx: Run index (0-based) whose files are awaited
+            inotify: inotify_simple.INotify watching the work directory, or
+                None to simply sleep for `timeout`
+            timeout: Maximum time to wait in seconds
+        """
+        if inotify is None:
+            time.sleep(timeout)
+            return
+        
+        # Count down the run's files as creation events arrive
+        remaining = set(self.expected_files_for_run(meta, run_idx))
+        remaining -= self.list_dir(self.work_dir)
+        
+        deadline = time.monotonic() + timeout
+        while remaining:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return
+            for event in inotify.read(timeout=int(left * 1000)):
+                remaining.discard(event.name)
+    
+    def daemon(self, sbatch_script: str = "submit.sh", poll_interval: float = 60.0,
+               max_retries: int = 0) -> None:
+        """
+        Keep submitting runs until the simulation is complete
+        
+        If inotify_simple is installed, the work directory is watched so the
+        engine wakes as soon as the current run's expected files are created.
+        Otherwise (or if the filesystem does not support inotify) it polls
+        every `poll_interval` seconds. Polling also runs alongside inotify to
+        catch jobs that ended without producing their files.
+        
+        A job that leaves the queue without completing its run counts as a
+        failure. The run is resubmitted at most `max_retries` times (counted
+        in the lock file), after which the daemon stops and reports the
+        failed job. The daemon also stops if a submission itself fails, or if
+        the running job is for a later run than the first incomplete one.
+        
+        Args:
+            sbatch_script: Path to the sbatch submission script
+            poll_interval: Seconds between progress checks without events
+            max_retries: Number of times a failed run is resubmitted
+        """
+        if not self.meta_file.exists():
+            print("No meta file found. Run with --gen-meta first.")
+            return
+        
+        inotify = None
+        try:
+            from inotify_simple import INotify, flags
+            inotify = INotify()
+            inotify.add_watch(self.work_dir, flags.CREATE | flags.MOVED_TO)
+        except (ImportError, OSError):
+            if inotify is not None:
+                inotify.close()
+                inotify = None
+            print(f"inotify unavailable, polling every {poll_interval} s")
+        
+        try:
+            while True:
+                meta = self.load_meta()
+                current_run = self.check_progress()
+                if current_run >= meta['num_runs']:
+                    print("All runs completed!")
+                    return
+                
+                lock = self.load_lock()
+                if lock is None or not self.is_job_running(lock['job_id']):
+                    # Nonzero if the job left the queue without completing its run
+                    attempts = self.lock_attempts(lock, meta, current_run)
+                    if attempts > 0:
+                        if attempts > max_retries:
+                            print(f"Run {current_run + 1}/{meta['num_runs']} failed: "
+                                  f"job {lock['job_id']} ended without producing its files.")
+                            print(f"Giving up after {attempts} submission(s). "
+                                  f"Check the job output, then unlock and resubmit.")
+                            return
+                        print(f"Job {lock['job_id']} ended without completing run "
+                              f"{current_run + 1}, retrying ({attempts}/{max_retries})")
+                    
+                    self.submit(sbatch_script=sbatch_script)
+                    if not self.lock_file.exists():
+                        print("Submission failed. Daemon stopped.")
+                        return
+                elif lock['run_idx'] > current_run:
+                    # Submitted past a gap; this job will never write the
+                    # files of the current run
+                    print(f"Job {lock['job_id']} is running run {lock['run_idx'] + 1}, "
+                          f"but run {current_run + 1} has not completed.")
+                    print("Daemon stopped. Resolve the gap and restart the daemon.")
+                    return
+                elif lock['run_idx'] < current_run:
+                    # Files of the locked run are done but the job has not
+                    # left the queue yet; check again shortly
+                    time.sleep(DAEMON_JOB_EXIT_INTERVAL)
+                    continue
+                
+                self.wait_for_run(meta, current_run, inotify, poll_interval)
+        except KeyboardInterrupt:
+            print("Daemon stopped.")
+        finally:
+            if inotify is not None:
+                inotify.close()
 
 
 def main():
@@ -523,6 +1172,12 @@ def main():
         help="Remove submission record file"
     )
     
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help="Keep submitting runs as previous ones complete"
+    )
+    
     parser.add_argument(
         '--work-dir',
         type=str,
@@ -537,6 +1192,21 @@ def main():
         help="Sbatch script filename (default: submit.sh)"
     )
     
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=60.0,
+        help="Seconds between progress checks in daemon mode (default: 60)"
+    )
+    
+    parser.add_argument(
+        '--max-retries',
+        type=int,
+        default=0,
+        help="Times the daemon resubmits a run whose job ended without "
+             "producing its files (default: 0)"
+    )
+    
     args = parser.parse_args()
     
     # Initialize engine
@@ -560,6 +1230,10 @@ def main():
             engine.reset()
         elif args.clear_record:
             engine.clear_record()
+        elif args.daemon:
+            engine.daemon(sbatch_script=args.sbatch_script,
+                          poll_interval=args.poll_interval,
+                          max_retries=args.max_retries)
         else:
             parser.print_help()
     